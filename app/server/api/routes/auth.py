@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from db.database import get_db
@@ -10,7 +10,12 @@ from models.schemas import (
     AuthResponse,
     UserResponse,
 )
-from services.user_service import create_user, get_user_by_email
+from services.user_service import (
+    UserAlreadyExistsError,
+    create_user,
+    get_user_by_email,
+    update_last_login,
+)
 from services.magic_link import generate_magic_link, validate_magic_link, send_magic_link_email
 from core.config import settings
 import logging
@@ -20,27 +25,38 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+async def _deliver_magic_link_email(email: str, magic_link_url: str):
+    """Send the magic link email from a background task, logging any failure.
+
+    The response has already been sent by the time this runs, so a delivery
+    error can only be logged.
+    """
+    try:
+        await send_magic_link_email(email, magic_link_url)
+    except Exception as e:
+        logger.error(f"Error sending magic link email: {str(e)}")
+
+
 @router.post("/register", response_model=AuthResponse, status_code=status.HTTP_201_CREATED)
 async def register(
     user_data: UserCreate,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
 ):
     """Register a new user with experience assessment and send magic link."""
-    # Check if user already exists
-    existing_user = await get_user_by_email(user_data.email, db)
-    if existing_user:
+    # Create user (fails if the email is already registered)
+    try:
+        user = await create_user(user_data, db, commit=False)
+    except UserAlreadyExistsError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User with this email already exists"
         )
 
-    # Create user
-    user = await create_user(user_data, db)
-
-    # Generate and send magic link
+    # Generate the magic link; the user, profile and link commit together
     try:
-        magic_link_url = await generate_magic_link(user.email, db)
-        await send_magic_link_email(user.email, magic_link_url)
+        magic_link_url = await generate_magic_link(user, db, commit=False)
+        await db.commit()
     except Exception as e:
         logger.error(f"Error generating magic link: {str(e)}")
         raise HTTPException(
@@ -48,6 +64,9 @@ async def register(
             detail="Error generating magic link"
         )
 
+    # Deliver the email after the response has been sent
+    background_tasks.add_task(_deliver_magic_link_email, user.email, magic_link_url)
+
     # For the response, we'll use the magic link token as access token temporarily
     # In a real app, you'd generate a proper JWT token here
     token = magic_link_url.split("token=")[-1]
@@ -61,6 +80,7 @@ async def register(
 @router.post("/magic-link", status_code=status.HTTP_200_OK)
 async def request_magic_link(
     request: MagicLinkRequest,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
 ):
     """Generate and send magic link for existing user."""
@@ -70,12 +90,14 @@ async def request_magic_link(
         return {"message": "If the email exists, a magic link has been sent"}
 
     try:
-        magic_link_url = await generate_magic_link(user.email, db)
-        await send_magic_link_email(user.email, magic_link_url)
+        magic_link_url = await generate_magic_link(user, db)
     except Exception as e:
         logger.error(f"Error generating magic link: {str(e)}")
         # Don't reveal error to user
-        pass
+        return {"message": "If the email exists, a magic link has been sent"}
+
+    # Deliver the email after the response has been sent
+    background_tasks.add_task(_deliver_magic_link_email, user.email, magic_link_url)
 
     return {"message": "If the email exists, a magic link has been sent"}
 
@@ -141,9 +163,7 @@ async def dev_login(
         )
 
     # Update last login
-    from datetime import datetime, UTC
-    user.last_login = datetime.now(UTC)
-    await db.commit()
+    await update_last_login(user.id, db)
 
     # Generate session token using the same serializer as magic_link service
     from services.magic_link import serializer
@@ -20,8 +20,7 @@ async def list_courses(db: AsyncSession = Depends(get_db)):
 @router.get("/{course_id}", response_model=CourseResponse)
 async def get_course(course_id: int, db: AsyncSession = Depends(get_db)):
     """Get course details by ID."""
-    result = await db.execute(select(Course).where(Course.id == course_id))
-    course = result.scalar_one_or_none()
+    course = await db.get(Course, course_id)
 
     if not course:
         raise HTTPException(
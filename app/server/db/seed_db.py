@@ -86,18 +86,19 @@ async def seed_db():
             }
         ]
 
+        users = []
         for user_data in users_data:
             # Create user
             user = User(
                 email=user_data["email"],
                 is_active=True
             )
-            db.add(user)
-            await db.flush()
+            users.append(user)
 
-            # Create experience profile with all extended fields
-            experience = UserExperience(
-                user_id=user.id,
+            # Create experience profile with all extended fields, linked through
+            # the relationship so user.id isn't needed before the final flush
+            UserExperience(
+                user=user,
                 # Basic Info
                 name=user_data["name"],
                 employment_status=user_data["employment_status"],
@@ -122,7 +123,9 @@ async def seed_db():
                 experience_level=user_data["experience_level"],
                 background=user_data["background"]
             )
-            db.add(experience)
+
+        # Users and their profiles are inserted in batches at commit
+        db.add_all(users)
 
         # Create sample courses
         courses_data = [
@@ -146,9 +149,7 @@ async def seed_db():
             }
         ]
 
-        for course_data in courses_data:
-            course = Course(**course_data)
-            db.add(course)
+        db.add_all([Course(**course_data) for course_data in courses_data])
 
         await db.commit()
         print("Database seeded successfully!")
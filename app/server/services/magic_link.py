@@ -1,7 +1,8 @@
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 from datetime import datetime, timedelta, UTC
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
 from db.models import User, MagicLink
 from core.config import settings
 import logging
@@ -12,17 +13,15 @@ logger = logging.getLogger(__name__)
 serializer = URLSafeTimedSerializer(settings.MAGIC_LINK_SECRET)
 
 
-async def generate_magic_link(email: str, db: AsyncSession) -> str:
-    """Generate a magic link token for the given email."""
-    # Create a secure token
-    token = serializer.dumps(email, salt="magic-link")
-
-    # Get user
-    result = await db.execute(select(User).where(User.email == email))
-    user = result.scalar_one_or_none()
+async def generate_magic_link(user: User, db: AsyncSession, commit: bool = True) -> str:
+    """Generate a magic link token for the given user.
 
-    if not user:
-        raise ValueError("User not found")
+    Callers pass the user they already loaded, so no lookup is repeated here.
+    With commit=False the link is left pending in the session for the
+    caller's commit to flush.
+    """
+    # Create a secure token
+    token = serializer.dumps(user.email, salt="magic-link")
 
     # Calculate expiry
     expires_at = datetime.now(UTC) + timedelta(minutes=settings.MAGIC_LINK_EXPIRY_MINUTES)
@@ -35,7 +34,8 @@ async def generate_magic_link(email: str, db: AsyncSession) -> str:
         used=False
     )
     db.add(magic_link)
-    await db.commit()
+    if commit:
+        await db.commit()
 
     # Construct magic link URL
     magic_link_url = f"{settings.FRONTEND_URL}/login?token={token}"
@@ -53,9 +53,11 @@ async def validate_magic_link(token: str, db: AsyncSession) -> tuple[User | None
             max_age=settings.MAGIC_LINK_EXPIRY_MINUTES * 60  # Convert to seconds
         )
 
-        # Get magic link from database
+        # Get magic link from database, loading its user in the same query
         result = await db.execute(
-            select(MagicLink).where(MagicLink.token == token)
+            select(MagicLink)
+            .options(joinedload(MagicLink.user))
+            .where(MagicLink.token == token)
         )
         magic_link = result.scalar_one_or_none()
 
@@ -73,24 +75,26 @@ async def validate_magic_link(token: str, db: AsyncSession) -> tuple[User | None
             logger.warning(f"Magic link expired for user {magic_link.user_id}")
             return None, None
 
-        # Mark as used
-        magic_link.used = True
-        await db.commit()
-
-        # Get user
-        result = await db.execute(select(User).where(User.id == magic_link.user_id))
-        user = result.scalar_one_or_none()
-
-        if user:
-            # Update last login
-            user.last_login = datetime.now(UTC)
-            await db.commit()
+        # Claim the link atomically: only the request that flips used from
+        # False to True gets through, so a replayed token does no more work
+        user = magic_link.user
+        result = await db.execute(
+            update(MagicLink)
+            .where(MagicLink.id == magic_link.id, MagicLink.used.is_(False))
+            .values(used=True)
+        )
+        if result.rowcount == 0:
+            logger.warning(f"Magic link already used for user {magic_link.user_id}")
+            return None, None
 
-            # Generate a long-lived session token
-            session_token = serializer.dumps({"user_id": user.id, "email": user.email}, salt="session")
-            return user, session_token
+        # Update last login in the same transaction as the claim, so a single
+        # commit covers both writes
+        user.last_login = datetime.now(UTC)
+        await db.commit()
 
-        return None, None
+        # Generate a long-lived session token
+        session_token = serializer.dumps({"user_id": user.id, "email": user.email}, salt="session")
+        return user, session_token
 
     except SignatureExpired:
         logger.warning("Magic link token signature expired")
@@ -116,11 +120,8 @@ async def validate_session_token(token: str, db: AsyncSession) -> User | None:
         if not user_id:
             return None
 
-        # Get user
-        result = await db.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
-
-        return user
+        # Get user by primary key
+        return await db.get(User, user_id)
 
     except SignatureExpired:
         logger.warning("Session token expired")
@@ -1,19 +1,33 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert
 from db.models import User, UserExperience
 from models.schemas import UserCreate
 from datetime import datetime, UTC
 
 
-async def create_user(user_data: UserCreate, db: AsyncSession) -> User:
-    """Create a new user with experience profile."""
-    # Create user
-    user = User(
-        email=user_data.email,
-        is_active=True
+class UserAlreadyExistsError(ValueError):
+    """Raised when registering an email that already has a user."""
+
+
+async def create_user(user_data: UserCreate, db: AsyncSession, commit: bool = True) -> User:
+    """Create a new user with experience profile.
+
+    With commit=False the experience profile is left pending in the session,
+    so the caller's commit flushes it together with any other work.
+
+    Raises UserAlreadyExistsError if a user with the same email already exists.
+    """
+    # Create user atomically; a duplicate email inserts nothing and returns no row
+    result = await db.execute(
+        insert(User)
+        .values(email=user_data.email, is_active=True)
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User)
     )
-    db.add(user)
-    await db.flush()  # Flush to get user.id
+    user = result.scalar_one_or_none()
+    if user is None:
+        raise UserAlreadyExistsError("User with this email already exists")
 
     # Create experience profile with all new extended fields
     experience = UserExperience(
@@ -38,8 +52,10 @@ async def create_user(user_data: UserCreate, db: AsyncSession) -> User:
         additional_comments=user_data.additional_comments
     )
     db.add(experience)
-    await db.commit()
-    await db.refresh(user)
+    if commit:
+        # RETURNING already loaded every column and the app's sessions don't
+        # expire on commit, so the user needs no refresh afterwards
+        await db.commit()
 
     return user
 
@@ -51,18 +67,16 @@ async def get_user_by_email(email: str, db: AsyncSession) -> User | None:
 
 
 async def get_user_by_id(user_id: int, db: AsyncSession) -> User | None:
-    """Get user by ID."""
-    result = await db.execute(select(User).where(User.id == user_id))
-    return result.scalar_one_or_none()
+    """Get user by ID (served from the session's identity map when loaded)."""
+    return await db.get(User, user_id)
 
 
 async def update_last_login(user_id: int, db: AsyncSession):
     """Update user's last login timestamp."""
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-    if user:
-        user.last_login = datetime.now(UTC)
-        await db.commit()
+    await db.execute(
+        update(User).where(User.id == user_id).values(last_login=datetime.now(UTC))
+    )
+    await db.commit()
 
 
 async def get_user_experience(user_id: int, db: AsyncSession) -> UserExperience | None:
@@ -1,9 +1,11 @@
 """Shared test fixtures and configuration."""
+import asyncio
 import pytest
-from fastapi.testclient import TestClient
-from datetime import datetime, UTC
+from unittest.mock import patch, AsyncMock
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import StaticPool
 
 from main import app
 from db.database import get_db, Base
@@ -11,23 +13,54 @@ from db.models import User, UserExperience
 
 
 # Create test database engine
-# Use file-based database to avoid isolation issues with :memory: and async
-TEST_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+# In-memory database: StaticPool hands the same single connection to every
+# session, so the schema and data are visible across sessions and no commit
+# ever touches the disk. Every pytest-xdist worker is a separate process and
+# so gets its own private database. The engine is shared by the whole test
+# session; async tests and fixtures run on one session-scoped event loop
+# (see [tool.pytest.ini_options] in pyproject.toml).
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 test_engine = create_async_engine(
     TEST_DATABASE_URL,
-    poolclass=NullPool,
+    poolclass=StaticPool,
     connect_args={"check_same_thread": False},
+    # Room for every statement the suite issues, so each is compiled once
+    query_cache_size=1200,
 )
+
+
+# pysqlite/aiosqlite defer BEGIN and would emit it after SAVEPOINT, breaking
+# nested transactions. Turn off the driver's own transaction handling and
+# emit BEGIN ourselves so the per-test SAVEPOINTs below work.
+@event.listens_for(test_engine.sync_engine, "connect")
+def _disable_driver_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(test_engine.sync_engine, "begin")
+def _emit_begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+# Sessions join the per-test outer transaction (see setup_database): commit
+# and rollback only release or roll back a SAVEPOINT inside it.
 TestSessionLocal = async_sessionmaker(
     test_engine,
     class_=AsyncSession,
     expire_on_commit=False,
+    join_transaction_mode="create_savepoint",
 )
 
 
+# Concurrent requests share the test's single connection, and SAVEPOINTs on
+# one connection must nest. Requests still overlap, but each one's session
+# waits its turn for the connection.
+_request_db_lock = asyncio.Lock()
+
+
 async def override_get_db():
     """Override the get_db dependency for testing."""
-    async with TestSessionLocal() as session:
+    async with _request_db_lock, TestSessionLocal() as session:
         try:
             yield session
             await session.commit()
@@ -36,24 +69,65 @@ async def override_get_db():
             raise
 
 
-# Override the dependency globally
-app.dependency_overrides[get_db] = override_get_db
+@pytest.fixture(scope="session", autouse=True)
+def override_dependencies():
+    """Install the app's dependency overrides once for the whole session."""
+    app.dependency_overrides[get_db] = override_get_db
+    yield
+    app.dependency_overrides.clear()
 
 
-@pytest.fixture(scope="function")
-def client():
-    """Create a test client for making HTTP requests."""
-    return TestClient(app)
+@pytest.fixture(scope="session", autouse=True)
+def stub_magic_link_email():
+    """Replace magic link email delivery with one mock for the whole session."""
+    with patch("api.routes.auth.send_magic_link_email", new_callable=AsyncMock) as mock_send:
+        yield mock_send
 
 
-@pytest.fixture(scope="function", autouse=True)
-async def setup_database():
-    """Create tables before each test and drop them after."""
+@pytest.fixture
+def mock_send_email(stub_magic_link_email):
+    """Session email stub, reset so call assertions only see the current test."""
+    stub_magic_link_email.reset_mock()
+    return stub_magic_link_email
+
+
+@pytest.fixture(scope="session")
+async def client(override_dependencies):
+    """Create one async test client, shared by every test, for making HTTP requests.
+
+    Requests run on the test's own event loop through ASGITransport, with no
+    thread hop per call, so tests can also issue them concurrently (their
+    database work is still serialized; see _request_db_lock).
+    """
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+async def session_engine():
+    """Create tables once for the whole test session and share the engine."""
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-    yield
-    async with test_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
+    yield test_engine
+    await test_engine.dispose()
+
+
+@pytest.fixture(scope="function", autouse=True)
+async def setup_database(session_engine):
+    """Run each test inside one outer transaction that is rolled back afterwards.
+
+    Every session (test_db and the app's get_db override) is bound to this
+    connection, so rows written during the test, committed or not, never
+    outlive it and no per-table cleanup is needed.
+    """
+    async with session_engine.connect() as conn:
+        trans = await conn.begin()
+        TestSessionLocal.configure(bind=conn)
+        try:
+            yield conn
+        finally:
+            TestSessionLocal.configure(bind=session_engine)
+            await trans.rollback()
 
 
 @pytest.fixture
@@ -66,16 +140,11 @@ async def test_db(setup_database):
 @pytest.fixture
 async def test_user(test_db, setup_database):
     """Create a test user."""
-    user = User(
-        email="test@example.com",
-        is_active=True,
-        created_at=datetime.now(UTC),
-    )
-    test_db.add(user)
-    await test_db.flush()
-
+    # created_at comes from the model's column default
+    user = User(email="test@example.com", is_active=True)
+    # Link through the relationship so both rows go out in a single flush
     experience = UserExperience(
-        user_id=user.id,
+        user=user,
         experience_level="Beginner",
         background="Testing",
         name="Test User",
@@ -87,7 +156,9 @@ async def test_user(test_db, setup_database):
         goals=["Learning new skills", "Educational purposes", "Personal productivity/organization"],
         learning_preference="Hands-on practice with examples"
     )
-    test_db.add(experience)
-    await test_db.commit()
-    await test_db.refresh(user)
+    test_db.add_all([user, experience])
+    # Flushing is enough: the app's sessions share this test's connection, so
+    # they see the rows without a commit. Every column the tests read is set
+    # client-side, so no refresh round trip is needed either
+    await test_db.flush()
     return user
@@ -0,0 +1,16 @@
+"""Plain helpers shared by the test modules."""
+import orjson
+
+
+JSON_HEADERS = {"content-type": "application/json"}
+
+
+def post_json(client, url, body):
+    """POST a JSON body serialized with orjson rather than httpx's stdlib json.
+
+    body is either a payload or bytes already produced by orjson.dumps, so a
+    test can serialize once and send the same body several times.
+    """
+    if not isinstance(body, bytes):
+        body = orjson.dumps(body)
+    return client.post(url, content=body, headers=JSON_HEADERS)
@@ -1,14 +1,23 @@
+import orjson
 import pytest
-from unittest.mock import patch, AsyncMock
+from types import MappingProxyType
+from unittest.mock import Mock
 from datetime import datetime, timedelta, UTC
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
 
 from db.models import MagicLink
+from models.schemas import UserCreate
+from services.user_service import create_user
+import services.magic_link as magic_link_service
 from services.magic_link import serializer
 from core.config import settings
+from tests.helpers import post_json
 
 
-# Helper for creating valid test data
-VALID_USER_DATA = {
+# Helper for creating valid test data. Read-only all the way down (nested
+# lists are stored as tuples); tests derive copies
+VALID_USER_DATA = MappingProxyType({
     "email": "test@example.com",
     "name": "Test User",
     "employment_status": "Student",
@@ -16,145 +25,160 @@ VALID_USER_DATA = {
     "tried_ai_before": True,
     "usage_frequency": "Weekly",
     "comfort_level": 3,
-    "goals": ["Learning new skills", "Personal productivity/organization", "Research and information gathering"],
+    "goals": ("Learning new skills", "Personal productivity/organization", "Research and information gathering"),
     "learning_preference": "Hands-on practice with examples"
-}
+})
 
+# Correctly signed token whose magic link is never stored
+ORPHAN_TOKEN = serializer.dumps("orphan@example.com", salt="magic-link")
 
-def test_register_creates_user_and_sends_magic_link(client):
+
+@pytest.fixture
+def dev_mode(monkeypatch):
+    """Enable the dev-only auth endpoints for one test."""
+    monkeypatch.setattr(settings, "DEV_MODE", True)
+
+
+@pytest.fixture
+def production_mode(monkeypatch):
+    """Disable the dev-only auth endpoints for one test."""
+    monkeypatch.setattr(settings, "DEV_MODE", False)
+
+
+@pytest.fixture
+def service_now(monkeypatch):
+    """Pin datetime.now() in the magic link service and return that instant.
+
+    The instant is naive to match what SQLite hands back for stored
+    timestamps (SQLite doesn't preserve timezone).
+    """
+    now = datetime.now()
+    mock_datetime = Mock()
+    mock_datetime.now.return_value = now
+    monkeypatch.setattr(magic_link_service, "datetime", mock_datetime)
+    return now
+
+
+@pytest.fixture
+def magic_link_token(test_user):
+    """Magic link token for the test_user email, freshly signed for each test.
+
+    The token carries its signing time and is checked against the real clock,
+    so it must not outlive the magic link expiry window.
+    """
+    return serializer.dumps(test_user.email, salt="magic-link")
+
+
+@pytest.fixture
+def add_magic_link(test_db, test_user, magic_link_token):
+    """Return a coroutine that stores a magic link for test_user.
+
+    The link is created at `now` and expires `expires_in` later; it is only
+    flushed, which is enough for the app's sessions to see it.
+    """
+    async def _add(now, expires_in=timedelta(minutes=15), used=False):
+        magic_link = MagicLink(
+            user_id=test_user.id,
+            token=magic_link_token,
+            expires_at=now + expires_in,
+            created_at=now,
+            used=used
+        )
+        test_db.add(magic_link)
+        await test_db.flush()
+        return magic_link
+
+    return _add
+
+
+@pytest.mark.asyncio
+async def test_register_creates_user_and_sends_magic_link(client, mock_send_email):
     """Test user registration creates user and experience profile."""
-    with patch("api.routes.auth.send_magic_link_email", new_callable=AsyncMock) as mock_send:
-        test_data = {**VALID_USER_DATA, "email": "newuser@example.com"}
-        response = client.post("/api/auth/register", json=test_data)
+    test_data = {**VALID_USER_DATA, "email": "newuser@example.com"}
+    response = await post_json(client, "/api/auth/register", test_data)
 
-        assert response.status_code == 201
-        data = response.json()
-        assert "access_token" in data
-        assert data["user"]["email"] == "newuser@example.com"
-        assert "id" in data["user"]
-        mock_send.assert_called_once()
+    assert response.status_code == 201
+    data = response.json()
+    assert "access_token" in data
+    assert data["user"]["email"] == "newuser@example.com"
+    assert "id" in data["user"]
+    mock_send_email.assert_called_once()
 
 
-def test_register_fails_with_duplicate_email(client):
+@pytest.mark.asyncio
+async def test_register_fails_with_duplicate_email(client):
     """Test registration fails when user already exists."""
-    test_data = {**VALID_USER_DATA, "email": "duplicate@example.com"}
+    # Serialize once and send the identical body twice
+    body = orjson.dumps({**VALID_USER_DATA, "email": "duplicate@example.com"})
 
     # First registration
-    with patch("api.routes.auth.send_magic_link_email", new_callable=AsyncMock):
-        client.post("/api/auth/register", json=test_data)
+    await post_json(client, "/api/auth/register", body)
 
     # Second registration with same email
-    with patch("api.routes.auth.send_magic_link_email", new_callable=AsyncMock):
-        response = client.post("/api/auth/register", json=test_data)
+    response = await post_json(client, "/api/auth/register", body)
 
-        assert response.status_code == 400
-        assert "already exists" in response.json()["detail"]
-
-
-def test_register_fails_with_empty_email(client):
-    """Test registration fails with invalid email."""
-    response = client.post(
-        "/api/auth/register",
-        json={
-            "email": "",
-            "experience_level": "Beginner",
-            "background": "Student",
-            "goals": "Learn"
-        }
-    )
-
-    assert response.status_code == 422  # Validation error
+    assert response.status_code == 400
+    assert "already exists" in response.json()["detail"]
 
 
-def test_register_fails_with_invalid_email_format(client):
-    """Test registration fails with malformed email."""
-    response = client.post(
-        "/api/auth/register",
-        json={
-            "email": "not-an-email",
-            "experience_level": "Beginner",
-            "background": "Student",
-            "goals": "Learn"
-        }
-    )
+@pytest.mark.parametrize(
+    "email",
+    [
+        pytest.param("", id="empty"),
+        pytest.param("not-an-email", id="malformed"),
+    ],
+)
+@pytest.mark.asyncio
+async def test_register_fails_with_invalid_email(client, email):
+    """Test registration fails with an empty or malformed email."""
+    response = await post_json(client, "/api/auth/register", {**VALID_USER_DATA, "email": email})
 
     assert response.status_code == 422  # Validation error
 
 
 @pytest.mark.asyncio
-async def test_magic_link_request_for_existing_user(client, test_db):
+async def test_magic_link_request_for_existing_user(client, test_db, mock_send_email):
     """Test magic link request endpoint for existing users."""
     # Create user directly without triggering magic link creation
-    from services.user_service import create_user
-    from models.schemas import UserCreate
-
-    from models.schemas import UserCreate
-
-    user_data = UserCreate(
-        email="existing@example.com",
-        name="Test User",
-        employment_status="Student",
-        primary_use_context="Educational purposes",
-        tried_ai_before=True,
-        usage_frequency="Weekly",
-        comfort_level=3,
-        goals=["Learning new skills", "Personal productivity/organization", "Research and information gathering"],
-        learning_preference="Hands-on practice with examples"
-    )
+    user_data = UserCreate(**{**VALID_USER_DATA, "email": "existing@example.com"})
     await create_user(user_data, test_db)
 
     # Request magic link
-    with patch("api.routes.auth.send_magic_link_email", new_callable=AsyncMock) as mock_send:
-        response = client.post(
-            "/api/auth/magic-link",
-            json={"email": "existing@example.com"}
-        )
+    response = await post_json(client, "/api/auth/magic-link", {"email": "existing@example.com"})
 
-        assert response.status_code == 200
-        assert "magic link has been sent" in response.json()["message"]
-        mock_send.assert_called_once()
+    assert response.status_code == 200
+    assert "magic link has been sent" in response.json()["message"]
+    mock_send_email.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_magic_link_email_failure_is_logged(client, test_user, mock_send_email, monkeypatch, caplog):
+    """Test a failed email delivery is logged without failing the request."""
+    monkeypatch.setattr(mock_send_email, "side_effect", RuntimeError("SMTP unavailable"))
 
+    response = await post_json(client, "/api/auth/magic-link", {"email": test_user.email})
 
-def test_magic_link_request_for_nonexistent_user(client):
+    assert response.status_code == 200
+    mock_send_email.assert_called_once()
+    assert "Error sending magic link email: SMTP unavailable" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_magic_link_request_for_nonexistent_user(client):
     """Test magic link request for non-existent user doesn't reveal user existence."""
-    response = client.post(
-        "/api/auth/magic-link",
-        json={"email": "nonexistent@example.com"}
-    )
+    response = await post_json(client, "/api/auth/magic-link", {"email": "nonexistent@example.com"})
 
     assert response.status_code == 200
     assert "magic link has been sent" in response.json()["message"]
 
 
 @pytest.mark.asyncio
-async def test_magic_link_validation_succeeds_with_valid_token(client, test_db, test_user):
+async def test_magic_link_validation_succeeds_with_valid_token(client, test_db, test_user, magic_link_token, service_now, add_magic_link):
     """Test magic link validation succeeds with valid token."""
-    # Generate magic link token
-    token = serializer.dumps(test_user.email, salt="magic-link")
-    # Use naive datetimes to match SQLite storage (SQLite doesn't preserve timezone)
-    now = datetime.now()  # Naive datetime
-    expires_at = now + timedelta(minutes=15)
-
-    magic_link = MagicLink(
-        user_id=test_user.id,
-        token=token,
-        expires_at=expires_at,
-        created_at=now,
-        used=False
-    )
-    test_db.add(magic_link)
-    await test_db.commit()
-
-    # Mock datetime.now in the service to return naive datetime for comparison
-    with patch('services.magic_link.datetime') as mock_datetime:
-        mock_datetime.now.return_value = now
-        mock_datetime.side_effect = lambda *args, **kw: datetime(*args, **kw)
-
-        # Validate token
-        response = client.post(
-            "/api/auth/validate",
-            json={"token": token}
-        )
+    magic_link = await add_magic_link(service_now)
+
+    # Validate token
+    response = await post_json(client, "/api/auth/validate", {"token": magic_link_token})
 
     assert response.status_code == 200
     data = response.json()
@@ -167,152 +191,148 @@ async def test_magic_link_validation_succeeds_with_valid_token(client, test_db,
 
 
 @pytest.mark.asyncio
-async def test_magic_link_validation_fails_with_expired_token(client, test_db, test_user):
-    """Test magic link validation fails with expired token."""
-    # Generate token with past expiry
-    token = serializer.dumps(test_user.email, salt="magic-link")
-    now = datetime.now(UTC)
-    expires_at = now - timedelta(minutes=1)  # Expired
-
-    magic_link = MagicLink(
-        user_id=test_user.id,
-        token=token,
-        expires_at=expires_at,
-        created_at=now,
-        used=False
-    )
-    test_db.add(magic_link)
-    await test_db.commit()
+async def test_magic_link_validation_rejects_replayed_token(client, magic_link_token, service_now, add_magic_link):
+    """Test a magic link can only be exchanged for a session once."""
+    await add_magic_link(service_now)
 
-    # Attempt to validate
-    response = client.post(
-        "/api/auth/validate",
-        json={"token": token}
-    )
+    # Serialize once and replay the identical body
+    body = orjson.dumps({"token": magic_link_token})
+    first = await post_json(client, "/api/auth/validate", body)
+    replay = await post_json(client, "/api/auth/validate", body)
 
-    assert response.status_code == 401
-    assert "Invalid or expired" in response.json()["detail"]
+    assert first.status_code == 200
+    assert replay.status_code == 401
+    assert "Invalid or expired" in replay.json()["detail"]
 
 
 @pytest.mark.asyncio
-async def test_magic_link_validation_fails_with_used_token(client, test_db, test_user):
-    """Test magic link validation fails with already used token."""
-    # Generate token that's already been used
-    token = serializer.dumps(test_user.email, salt="magic-link")
-    now = datetime.now(UTC)
-    expires_at = now + timedelta(minutes=15)
-
-    magic_link = MagicLink(
-        user_id=test_user.id,
-        token=token,
-        expires_at=expires_at,
-        created_at=now,
-        used=True  # Already used
-    )
-    test_db.add(magic_link)
-    await test_db.commit()
-
-    # Attempt to validate
-    response = client.post(
-        "/api/auth/validate",
-        json={"token": token}
-    )
-
+async def test_magic_link_validation_loses_race_to_concurrent_claim(client, test_db, test_user, magic_link_token, service_now, add_magic_link):
+    """Test the claim rejects a link another request used after it was read."""
+    magic_link = await add_magic_link(service_now)
+    claims = []
+
+    def claim_first(orm_execute_state):
+        # Runs just before validate_magic_link's own claim, after the link was
+        # read as unused: a concurrent request marks it used in between
+        if orm_execute_state.is_update and not claims:
+            claims.append(orm_execute_state.statement)
+            orm_execute_state.session.connection().execute(
+                update(MagicLink).where(MagicLink.id == magic_link.id).values(used=True)
+            )
+
+    event.listen(Session, "do_orm_execute", claim_first)
+    try:
+        response = await post_json(client, "/api/auth/validate", {"token": magic_link_token})
+    finally:
+        event.remove(Session, "do_orm_execute", claim_first)
+
+    # The link passed the used check and was turned away by the claim itself
+    assert len(claims) == 1
     assert response.status_code == 401
     assert "Invalid or expired" in response.json()["detail"]
 
+    await test_db.refresh(test_user)
+    assert test_user.last_login is None
+
+
+@pytest.mark.parametrize(
+    "expires_in, used",
+    [
+        pytest.param(timedelta(minutes=-1), False, id="expired"),
+        pytest.param(timedelta(minutes=15), True, id="already_used"),
+    ],
+)
+@pytest.mark.asyncio
+async def test_magic_link_validation_fails_for_spent_link(client, magic_link_token, add_magic_link, expires_in, used):
+    """Test magic link validation fails when the link has expired or was already used."""
+    await add_magic_link(datetime.now(UTC), expires_in=expires_in, used=used)
 
-def test_validate_endpoint_with_invalid_token(client):
-    """Test validate endpoint with completely invalid token."""
-    response = client.post(
-        "/api/auth/validate",
-        json={"token": "completely-invalid-token"}
-    )
+    # Attempt to validate
+    response = await post_json(client, "/api/auth/validate", {"token": magic_link_token})
 
     assert response.status_code == 401
     assert "Invalid or expired" in response.json()["detail"]
 
 
-def test_validate_endpoint_with_token_not_in_database(client):
-    """Test validate endpoint with valid signature but token not in database."""
-    # Generate a valid token but don't store it in database
-    token = serializer.dumps("orphan@example.com", salt="magic-link")
-
-    response = client.post(
-        "/api/auth/validate",
-        json={"token": token}
-    )
+@pytest.mark.parametrize(
+    "token",
+    [
+        pytest.param("completely-invalid-token", id="bad_signature"),
+        # Valid signature, but never stored in the database
+        pytest.param(ORPHAN_TOKEN, id="not_in_database"),
+    ],
+)
+@pytest.mark.asyncio
+async def test_validate_endpoint_rejects_unknown_token(client, token):
+    """Test validate endpoint rejects tokens that don't match a stored magic link."""
+    response = await post_json(client, "/api/auth/validate", {"token": token})
 
     assert response.status_code == 401
     assert "Invalid or expired" in response.json()["detail"]
 
 
-def test_logout_endpoint(client):
+@pytest.mark.asyncio
+async def test_logout_endpoint(client):
     """Test logout endpoint returns success."""
-    response = client.post("/api/auth/logout")
+    response = await client.post("/api/auth/logout")
     assert response.status_code == 200
     assert "Logged out successfully" in response.json()["message"]
 
 
+@pytest.mark.usefixtures("dev_mode")
 @pytest.mark.asyncio
-async def test_dev_users_endpoint_in_dev_mode(client, test_db, test_user):
+async def test_dev_users_endpoint_in_dev_mode(client, test_user):
     """Test dev-users endpoint returns user list in dev mode."""
-    with patch.object(settings, "DEV_MODE", True):
-        response = client.get("/api/auth/dev-users")
+    response = await client.get("/api/auth/dev-users")
 
-        assert response.status_code == 200
-        users = response.json()
-        assert len(users) >= 1
-        assert any(u["email"] == test_user.email for u in users)
+    assert response.status_code == 200
+    users = response.json()
+    assert len(users) >= 1
+    assert test_user.email in {u["email"] for u in users}
 
 
-def test_dev_users_endpoint_blocked_in_production(client):
+@pytest.mark.usefixtures("production_mode")
+@pytest.mark.asyncio
+async def test_dev_users_endpoint_blocked_in_production(client):
     """Test dev-users endpoint is blocked in production mode."""
-    with patch.object(settings, "DEV_MODE", False):
-        response = client.get("/api/auth/dev-users")
+    response = await client.get("/api/auth/dev-users")
 
-        assert response.status_code == 404
-        assert "Not available in production" in response.json()["detail"]
+    assert response.status_code == 404
+    assert "Not available in production" in response.json()["detail"]
 
 
+@pytest.mark.usefixtures("dev_mode")
 @pytest.mark.asyncio
 async def test_dev_login_succeeds_in_dev_mode(client, test_db, test_user):
     """Test dev login endpoint works in dev mode."""
-    with patch.object(settings, "DEV_MODE", True):
-        response = client.post(
-            "/api/auth/dev-login",
-            json={"email": test_user.email}
-        )
+    response = await post_json(client, "/api/auth/dev-login", {"email": test_user.email})
 
-        assert response.status_code == 200
-        data = response.json()
-        assert "access_token" in data
-        assert data["user"]["email"] == test_user.email
+    assert response.status_code == 200
+    data = response.json()
+    assert "access_token" in data
+    assert data["user"]["email"] == test_user.email
+    assert data["user"]["last_login"] is not None
 
-        # Verify last_login was updated
-        await test_db.refresh(test_user)
-        assert test_user.last_login is not None
+    # Verify last_login was updated
+    await test_db.refresh(test_user)
+    assert test_user.last_login is not None
 
 
-def test_dev_login_blocked_in_production(client):
+@pytest.mark.usefixtures("production_mode")
+@pytest.mark.asyncio
+async def test_dev_login_blocked_in_production(client):
     """Test dev login endpoint is blocked in production mode."""
-    with patch.object(settings, "DEV_MODE", False):
-        response = client.post(
-            "/api/auth/dev-login",
-            json={"email": "test@example.com"}
-        )
+    response = await post_json(client, "/api/auth/dev-login", {"email": "test@example.com"})
 
-        assert response.status_code == 404
-        assert "Not available in production" in response.json()["detail"]
+    assert response.status_code == 404
+    assert "Not available in production" in response.json()["detail"]
 
 
-def test_dev_login_fails_with_nonexistent_user(client):
+@pytest.mark.usefixtures("dev_mode")
+@pytest.mark.asyncio
+async def test_dev_login_fails_with_nonexistent_user(client):
     """Test dev login fails when user doesn't exist."""
-    with patch.object(settings, "DEV_MODE", True):
-        response = client.post(
-            "/api/auth/dev-login",
-            json={"email": "nonexistent@example.com"}
-        )
+    response = await post_json(client, "/api/auth/dev-login", {"email": "nonexistent@example.com"})
 
-        assert response.status_code == 404
-        assert "User not found" in response.json()["detail"]
+    assert response.status_code == 404
+    assert "User not found" in response.json()["detail"]
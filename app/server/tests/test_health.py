@@ -1,11 +1,10 @@
-from fastapi.testclient import TestClient
-from main import app
+import pytest
 
-client = TestClient(app)
 
-def test_health_check():
+@pytest.mark.asyncio
+async def test_health_check(client):
     """Test the health check endpoint"""
-    response = client.get("/api/health")
+    response = await client.get("/api/health")
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == "healthy"
@@ -1,6 +1,9 @@
 import pytest
 from datetime import datetime
+from sqlalchemy import select, func
+from db.models import User
 from services.user_service import (
+    UserAlreadyExistsError,
     create_user,
     get_user_by_email,
     get_user_by_id,
@@ -49,50 +52,52 @@ async def test_create_user_with_experience_profile(test_db):
     assert experience.background == "Computer Science student"
 
 
-@pytest.mark.asyncio
-async def test_get_user_by_email(test_db):
-    """Test get user by email"""
-    # Create a user first
-    user_data = create_valid_user_data("findme@example.com")
-    created_user = await create_user(user_data, test_db)
-
-    # Retrieve by email
-    found_user = await get_user_by_email("findme@example.com", test_db)
-
-    assert found_user is not None
-    assert found_user.id == created_user.id
-    assert found_user.email == "findme@example.com"
+@pytest.fixture
+async def shared_user(test_db):
+    """Create one user for the lookup cases to find."""
+    return await create_user(create_valid_user_data("findme@example.com"), test_db)
 
 
+@pytest.mark.parametrize(
+    "lookup, key_attr",
+    [
+        pytest.param(get_user_by_email, "email", id="by_email"),
+        pytest.param(get_user_by_id, "id", id="by_id"),
+    ],
+)
 @pytest.mark.asyncio
-async def test_get_user_by_email_not_found(test_db):
-    """Test get user by email when user doesn't exist"""
-    found_user = await get_user_by_email("nonexistent@example.com", test_db)
+async def test_get_user_finds_created_user(test_db, shared_user, lookup, key_attr):
+    """Test get user by email / by ID returns the created user"""
+    found_user = await lookup(getattr(shared_user, key_attr), test_db)
 
-    assert found_user is None
+    assert found_user is not None
+    assert found_user.id == shared_user.id
+    assert found_user.email == "findme@example.com"
 
 
 @pytest.mark.asyncio
-async def test_get_user_by_id(test_db):
-    """Test get user by ID"""
-    # Create a user first
-    user_data = create_valid_user_data("findbyid@example.com")
-    created_user = await create_user(user_data, test_db)
+async def test_create_user_without_commit_leaves_transaction_open(test_db):
+    """Test create_user(commit=False) leaves the commit, and a rollback, to the caller"""
+    user = await create_user(create_valid_user_data("nocommit@example.com"), test_db, commit=False)
+    assert user.id is not None
 
-    # Retrieve by ID
-    found_user = await get_user_by_id(created_user.id, test_db)
+    await test_db.rollback()
 
-    assert found_user is not None
-    assert found_user.id == created_user.id
-    assert found_user.email == "findbyid@example.com"
+    assert await get_user_by_email("nocommit@example.com", test_db) is None
 
 
+@pytest.mark.parametrize(
+    "lookup, key",
+    [
+        pytest.param(get_user_by_email, "nonexistent@example.com", id="by_email"),
+        pytest.param(get_user_by_id, 99999, id="by_id"),
+        pytest.param(get_user_experience, 99999, id="experience"),
+    ],
+)
 @pytest.mark.asyncio
-async def test_get_user_by_id_not_found(test_db):
-    """Test get user by ID when user doesn't exist"""
-    found_user = await get_user_by_id(99999, test_db)
-
-    assert found_user is None
+async def test_lookup_returns_none_when_missing(test_db, lookup, key):
+    """Test user and experience lookups return None when nothing matches"""
+    assert await lookup(key, test_db) is None
 
 
 @pytest.mark.asyncio
@@ -136,30 +141,19 @@ async def test_get_user_experience_profile(test_db):
     assert experience.goals is not None
 
 
+@pytest.mark.parametrize(
+    "email",
+    [
+        pytest.param("", id="empty"),
+        pytest.param("not-an-email", id="invalid_format"),
+    ],
+)
 @pytest.mark.asyncio
-async def test_get_user_experience_nonexistent_user(test_db):
-    """Test get user experience for nonexistent user"""
-    experience = await get_user_experience(99999, test_db)
-
-    assert experience is None
-
-
-@pytest.mark.asyncio
-async def test_create_user_empty_email(test_db):
-    """Test edge case: empty email in registration"""
-    with pytest.raises(Exception):  # Pydantic validation should fail
-        UserCreate(
-            email="",
-            experience_level="Beginner"
-        )
-
-
-@pytest.mark.asyncio
-async def test_create_user_invalid_email_format(test_db):
-    """Test edge case: invalid email format"""
+async def test_create_user_rejects_bad_email(email):
+    """Test edge case: empty or malformed email in registration"""
     with pytest.raises(Exception):  # Pydantic validation should fail
         UserCreate(
-            email="not-an-email",
+            email=email,
             experience_level="Beginner"
         )
 
@@ -173,9 +167,15 @@ async def test_create_user_duplicate_email(test_db):
     await create_user(user_data, test_db)
 
     # Attempt to create duplicate
-    with pytest.raises(Exception):  # Should raise integrity error
+    with pytest.raises(UserAlreadyExistsError):
         await create_user(user_data, test_db)
 
+    # Only the first user was stored (count rows rather than loading them)
+    user_count = await test_db.scalar(
+        select(func.count()).select_from(User).where(User.email == "duplicate@example.com")
+    )
+    assert user_count == 1
+
 
 @pytest.mark.asyncio
 async def test_create_user_very_long_text_fields(test_db):
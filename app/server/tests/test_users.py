@@ -1,172 +1,150 @@
-from unittest.mock import AsyncMock, patch
-
-
-def test_get_current_user_profile_requires_authentication(client):
-    """Test that /me endpoint requires authentication"""
-    response = client.get("/api/users/me")
+import pytest
+from collections import namedtuple
+from datetime import datetime, UTC
+from unittest.mock import create_autospec
+
+import api.routes.users as users_routes
+from db.models import UserExperience
+from services.magic_link import validate_session_token
+from services.user_service import get_user_experience
+
+# Fixed timestamp for mocked rows, so responses are reproducible
+FIXED_UTC = datetime(2025, 1, 1, tzinfo=UTC)
+
+# Plain stand-in for an authenticated User row, with just the fields the
+# routes serialize
+_FakeUser = namedtuple("_FakeUser", ("id", "email", "created_at", "last_login"))
+FAKE_USER = _FakeUser(1, "test@example.com", FIXED_UTC, None)
+
+
+@pytest.fixture
+def mock_validate(monkeypatch):
+    """Replace session token validation in the users routes."""
+    mock = create_autospec(validate_session_token)
+    monkeypatch.setattr(users_routes, "validate_session_token", mock)
+    return mock
+
+
+@pytest.fixture
+def mock_get_experience(monkeypatch):
+    """Replace the experience profile lookup in the users routes."""
+    mock = create_autospec(get_user_experience)
+    monkeypatch.setattr(users_routes, "get_user_experience", mock)
+    return mock
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        pytest.param("/api/users/me", id="profile"),
+        pytest.param("/api/users/me/experience", id="experience"),
+    ],
+)
+@pytest.mark.parametrize(
+    "headers, detail",
+    [
+        pytest.param({}, "Not authenticated", id="no_header"),
+        pytest.param({"Authorization": ""}, "Not authenticated", id="empty_header"),
+        pytest.param(
+            {"Authorization": "Bearer invalid_token_123"},
+            "Invalid authentication credentials",
+            id="invalid_token",
+        ),
+        # e.g. the session expired while the user was on a course page
+        pytest.param(
+            {"Authorization": "Bearer expired_token_abc"},
+            "Invalid authentication credentials",
+            id="expired_token",
+        ),
+        pytest.param(
+            {"Authorization": "just_a_token"},
+            "Invalid authentication credentials",
+            id="missing_bearer_prefix",
+        ),
+    ],
+)
+@pytest.mark.asyncio
+async def test_user_endpoints_reject_unauthenticated_requests(client, path, headers, detail):
+    """Test that /me endpoints require a valid Bearer token"""
+    response = await client.get(path, headers=headers)
     assert response.status_code == 401
-    assert response.json()["detail"] == "Not authenticated"
+    assert response.json()["detail"] == detail
 
 
-def test_get_current_user_profile_with_invalid_token(client):
-    """Test that /me endpoint rejects invalid tokens"""
-    response = client.get(
-        "/api/users/me",
-        headers={"Authorization": "Bearer invalid_token_123"}
-    )
-    assert response.status_code == 401
-    assert response.json()["detail"] == "Invalid authentication credentials"
+@pytest.mark.asyncio
+async def test_missing_experience_profile(client, mock_validate, mock_get_experience):
+    """Test edge case: user exists but has no experience profile"""
+    # Mock user authentication
+    mock_validate.return_value = FAKE_USER
 
+    # Mock missing experience profile
+    mock_get_experience.return_value = None
 
-def test_get_current_user_profile_with_missing_bearer_prefix(client):
-    """Test that /me endpoint requires Bearer prefix"""
-    response = client.get(
-        "/api/users/me",
-        headers={"Authorization": "just_a_token"}
+    response = await client.get(
+        "/api/users/me/experience",
+        headers={"Authorization": "Bearer valid_token"}
     )
-    assert response.status_code == 401
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Experience profile not found"
 
 
-def test_get_current_user_experience_requires_authentication(client):
-    """Test that /me/experience endpoint requires authentication"""
-    response = client.get("/api/users/me/experience")
-    assert response.status_code == 401
-    assert response.json()["detail"] == "Not authenticated"
-
+@pytest.mark.asyncio
+async def test_get_current_user_profile_success(client, mock_validate):
+    """Test successful retrieval of user profile with valid token"""
+    # Mock authenticated user
+    mock_validate.return_value = FAKE_USER
 
-def test_get_current_user_experience_with_invalid_token(client):
-    """Test that /me/experience endpoint rejects invalid tokens"""
-    response = client.get(
-        "/api/users/me/experience",
-        headers={"Authorization": "Bearer invalid_token_123"}
+    response = await client.get(
+        "/api/users/me",
+        headers={"Authorization": "Bearer valid_token_123"}
     )
-    assert response.status_code == 401
-    assert response.json()["detail"] == "Invalid authentication credentials"
+    assert response.status_code == 200
+    data = response.json()
+    assert data["email"] == "test@example.com"
+    assert data["id"] == 1
 
 
-def test_get_current_user_profile_with_expired_token(client):
-    """Test edge case: expired token while user is on course page"""
-    # Simulate expired token scenario
-    response = client.get(
-        "/api/users/me",
-        headers={"Authorization": "Bearer expired_token_abc"}
+@pytest.mark.asyncio
+async def test_get_current_user_experience_success(client, mock_validate, mock_get_experience):
+    """Test successful retrieval of user experience with valid token"""
+    # Mock authenticated user
+    mock_validate.return_value = FAKE_USER
+
+    # Mock experience profile - create a proper mock object
+    mock_experience = UserExperience(
+        id=1,
+        user_id=1,
+        experience_level="Intermediate",
+        background="Software Engineering",
+        goals="Build AI applications",
+        created_at=FIXED_UTC
     )
-    assert response.status_code == 401
-    assert response.json()["detail"] == "Invalid authentication credentials"
+    mock_get_experience.return_value = mock_experience
 
-
-def test_get_current_user_experience_with_expired_token(client):
-    """Test edge case: expired token when accessing experience endpoint"""
-    response = client.get(
+    response = await client.get(
         "/api/users/me/experience",
-        headers={"Authorization": "Bearer expired_token_abc"}
+        headers={"Authorization": "Bearer valid_token_123"}
     )
-    assert response.status_code == 401
-    assert response.json()["detail"] == "Invalid authentication credentials"
+    assert response.status_code == 200
+    data = response.json()
+    assert data["user_id"] == 1
+    assert data["experience_level"] == "Intermediate"
+    assert data["background"] == "Software Engineering"
+    assert data["goals"] == "Build AI applications"
+
 
+@pytest.mark.asyncio
+async def test_token_validation_called_with_correct_token(client, mock_validate):
+    """Test that validate_session_token is called with extracted token"""
+    mock_validate.return_value = FAKE_USER
 
-def test_authorization_header_extraction(client):
-    """Test that authorization header is properly extracted and logged"""
-    # Test with malformed authorization header
-    response = client.get(
+    response = await client.get(
         "/api/users/me",
-        headers={"Authorization": ""}
+        headers={"Authorization": "Bearer my_secret_token"}
     )
-    assert response.status_code == 401
 
-
-def test_missing_experience_profile(client):
-    """Test edge case: user exists but has no experience profile"""
-    with patch('api.routes.users.validate_session_token', new_callable=AsyncMock) as mock_validate, \
-         patch('api.routes.users.get_user_experience', new_callable=AsyncMock) as mock_get_experience:
-        # Mock user authentication
-        mock_user = AsyncMock()
-        mock_user.id = 1
-        mock_user.email = "test@example.com"
-        mock_user.created_at = "2025-01-01T00:00:00"
-        mock_validate.return_value = mock_user
-
-        # Mock missing experience profile
-        mock_get_experience.return_value = None
-
-        response = client.get(
-            "/api/users/me/experience",
-            headers={"Authorization": "Bearer valid_token"}
-        )
-        assert response.status_code == 404
-        assert response.json()["detail"] == "Experience profile not found"
-
-
-def test_get_current_user_profile_success(client):
-    """Test successful retrieval of user profile with valid token"""
-    with patch('api.routes.users.validate_session_token', new_callable=AsyncMock) as mock_validate:
-        # Mock authenticated user
-        mock_user = AsyncMock()
-        mock_user.id = 1
-        mock_user.email = "test@example.com"
-        mock_user.created_at = "2025-01-01T00:00:00"
-        mock_validate.return_value = mock_user
-
-        response = client.get(
-            "/api/users/me",
-            headers={"Authorization": "Bearer valid_token_123"}
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert data["email"] == "test@example.com"
-        assert data["id"] == 1
-
-
-def test_get_current_user_experience_success(client):
-    """Test successful retrieval of user experience with valid token"""
-    with patch('api.routes.users.validate_session_token', new_callable=AsyncMock) as mock_validate, \
-         patch('api.routes.users.get_user_experience', new_callable=AsyncMock) as mock_get_experience:
-        # Mock authenticated user
-        mock_user = AsyncMock()
-        mock_user.id = 1
-        mock_user.email = "test@example.com"
-        mock_validate.return_value = mock_user
-
-        # Mock experience profile - create a proper mock object
-        from db.models import UserExperience
-        from datetime import datetime, UTC
-        mock_experience = UserExperience(
-            id=1,
-            user_id=1,
-            experience_level="Intermediate",
-            background="Software Engineering",
-            goals="Build AI applications",
-            created_at=datetime.now(UTC)
-        )
-        mock_get_experience.return_value = mock_experience
-
-        response = client.get(
-            "/api/users/me/experience",
-            headers={"Authorization": "Bearer valid_token_123"}
-        )
-        assert response.status_code == 200
-        data = response.json()
-        assert data["user_id"] == 1
-        assert data["experience_level"] == "Intermediate"
-        assert data["background"] == "Software Engineering"
-        assert data["goals"] == "Build AI applications"
-
-
-def test_token_validation_called_with_correct_token(client):
-    """Test that validate_session_token is called with extracted token"""
-    with patch('api.routes.users.validate_session_token', new_callable=AsyncMock) as mock_validate:
-        mock_user = AsyncMock()
-        mock_user.id = 1
-        mock_user.email = "test@example.com"
-        mock_validate.return_value = mock_user
-
-        response = client.get(
-            "/api/users/me",
-            headers={"Authorization": "Bearer my_secret_token"}
-        )
-
-        # Verify token was extracted correctly (without "Bearer " prefix)
-        mock_validate.assert_called_once()
-        call_args = mock_validate.call_args[0]
-        assert call_args[0] == "my_secret_token"
-        assert response.status_code == 200
+    # Verify token was extracted correctly (without "Bearer " prefix)
+    mock_validate.assert_called_once()
+    call_args = mock_validate.call_args[0]
+    assert call_args[0] == "my_secret_token"
+    assert response.status_code == 200